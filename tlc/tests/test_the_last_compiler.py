@@ -0,0 +1,77 @@
+import tomllib
+
+import pytest
+
+from tlc.the_last_compiler import add_project_scripts, spec_names
+
+
+@pytest.fixture
+def pyproject(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "pyproject.toml"
+
+
+def scripts_in(path):
+    return tomllib.loads(path.read_text())["project"]["scripts"]
+
+
+def test_adds_table_when_missing(pyproject):
+    pyproject.write_text('[project]\nname = "demo"\n')
+
+    assert add_project_scripts([spec_names("my-module.md")])
+
+    assert scripts_in(pyproject) == {"my-module": "tlc.my_module:main"}
+    assert pyproject.read_text().startswith('[project]\nname = "demo"\n')
+
+
+def test_adds_to_existing_header(pyproject):
+    pyproject.write_text('[project]\nname = "demo"\n\n[project.scripts]\ntlc = "tlc.the_last_compiler:main"\n\n[tool.uv]\npackage = true\n')
+
+    assert add_project_scripts([spec_names("my-module.md")])
+
+    assert scripts_in(pyproject) == {"tlc": "tlc.the_last_compiler:main", "my-module": "tlc.my_module:main"}
+    assert tomllib.loads(pyproject.read_text())["tool"] == {"uv": {"package": True}}
+
+
+def test_adds_to_header_with_trailing_comment(pyproject):
+    pyproject.write_text('[project]\nname = "demo"\n\n[project.scripts]  # entry points\ntlc = "tlc.the_last_compiler:main"\n')
+
+    assert add_project_scripts([spec_names("my-module.md")])
+
+    assert scripts_in(pyproject) == {"tlc": "tlc.the_last_compiler:main", "my-module": "tlc.my_module:main"}
+    assert "[project.scripts]  # entry points\n" in pyproject.read_text()
+
+
+def test_leaves_empty_inline_table_alone(pyproject):
+    original = '[project]\nname = "demo"\nscripts = {}\n'
+    pyproject.write_text(original)
+
+    assert not add_project_scripts([spec_names("my-module.md")])
+
+    assert pyproject.read_text() == original
+
+
+def test_duplicate_names_are_added_once(pyproject):
+    pyproject.write_text('[project]\nname = "demo"\n')
+
+    assert add_project_scripts([spec_names("a/my-module.md"), spec_names("b/my-module.md")])
+
+    assert pyproject.read_text().count("my-module =") == 1
+    assert scripts_in(pyproject) == {"my-module": "tlc.my_module:main"}
+
+
+def test_existing_entry_is_not_duplicated(pyproject):
+    original = '[project]\nname = "demo"\n\n[project.scripts]\nmy-module = "tlc.my_module:main"\n'
+    pyproject.write_text(original)
+
+    assert add_project_scripts([spec_names("my-module.md")])
+
+    assert pyproject.read_text() == original
+
+
+def test_adds_to_indented_header(pyproject):
+    pyproject.write_text('[project]\nname = "demo"\n\n  [project.scripts]\n  tlc = "tlc.the_last_compiler:main"\n')
+
+    assert add_project_scripts([spec_names("my-module.md")])
+
+    assert scripts_in(pyproject) == {"tlc": "tlc.the_last_compiler:main", "my-module": "tlc.my_module:main"}
@@ -1,9 +1,17 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
+import json
+import hashlib
+import functools
+import asyncio
 import argparse
+import tempfile
+import tomllib
 import subprocess
 import jinja2
+from collections import namedtuple
 from pathlib import Path
 
 # Jinja2 templates for prompts
@@ -20,7 +28,7 @@ The module should be created at tlc/{{ module_name }}.py
 {% if test_strategy %}
 If a test strategy is specified, implement it in tlc/tests/test_{{ module_name }}.py
 {% endif %}
-
+{% if edit_pyproject %}
 Update the pyproject.toml file to add the new module entry point, using this format:
 ```python
 [project.scripts]
@@ -28,6 +36,11 @@ Update the pyproject.toml file to add the new module entry point, using this for
 ```
 
 This script should be sufficient to implement the module. You must only add the {{ module_name }}.py module and edit the pyproject.toml file if needed.
+{% else %}
+Do not edit the pyproject.toml file. The {{ command_name }} entry point will be added for you once all modules are compiled.
+
+This script should be sufficient to implement the module. You must only add the {{ module_name }}.py module.
+{% endif %}
 
 # Module Specification
 {{ specification }}
@@ -48,50 +61,95 @@ TODO define outputs
 TODO define implementation. Be really specific about what code to write, and where to write it.
 """
 
+CACHE_DIR = os.path.expanduser('~/.cache/tlc')
+JINJA_CACHE_DIR = os.path.join(CACHE_DIR, 'jinja')
+COMPILE_CACHE_PATH = os.path.join(CACHE_DIR, 'compiled.json')
+PROMPT_PATH = Path('bin/prompt/the_last_compiler.md')
+PYPROJECT_PATH = Path('pyproject.toml')
+DEFAULT_COMPILE_JOBS = 4
+
+_TEST_RE = re.compile(rb'test', re.IGNORECASE)
+_SCRIPTS_HEADER_RE = re.compile(r'^[ \t]*\[[ \t]*project[ \t]*\.[ \t]*scripts[ \t]*\][ \t]*(#.*)?$', re.MULTILINE)
+
+
+@functools.lru_cache(maxsize=None)
+def get_claude_template():
+    """Build the Claude prompt template on first use, caching its bytecode on disk when possible."""
+    try:
+        os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+        writable = os.access(JINJA_CACHE_DIR, os.W_OK)
+    except OSError:
+        writable = False
+    bytecode_cache = jinja2.FileSystemBytecodeCache(directory=JINJA_CACHE_DIR) if writable else None
+    
+    # Templates are loaded by name so the on-disk bytecode cache key is stable between runs
+    env = jinja2.Environment(
+        loader=jinja2.DictLoader({'claude_prompt': CLAUDE_PROMPT_TEMPLATE}),
+        bytecode_cache=bytecode_cache,
+        autoescape=False,
+        cache_size=400,
+        auto_reload=False,
+    )
+    return env.get_template('claude_prompt')
 
-def convert_name(name):
-    """Convert between markdown file name and Python module name."""
-    if name.endswith('.md'):
-        # my-module-name.md -> my_module_name
-        return name[:-3].replace('-', '_')
-    else:
-        # my_module_name -> my-module-name.md
-        return name.replace('_', '-') + '.md'
 
+SpecNames = namedtuple('SpecNames', ['module_name', 'command_name', 'module_path', 'test_path'])
 
-def render_prompt(spec_path):
-    """Render the Claude prompt using the specification markdown file."""
-    with open(spec_path, 'r') as f:
-        spec_content = f.read()
-    
-    module_name = convert_name(os.path.basename(spec_path))
-    command_name = module_name.replace('_', '-')
-    
-    # Extract test strategy info - simple check if tests are mentioned
-    test_strategy = "test" in spec_content.lower()
-    
-    template = jinja2.Template(CLAUDE_PROMPT_TEMPLATE)
-    prompt = template.render(
+
+def spec_names(spec_path):
+    """Derive the module, command, module path and test path names for a specification file."""
+    # my-module-name.md -> my-module-name, my_module_name
+    command_name = os.path.basename(spec_path)
+    if command_name.endswith('.md'):
+        command_name = command_name[:-3]
+    module_name = command_name.replace('-', '_')
+    return SpecNames(
         module_name=module_name,
         command_name=command_name,
-        specification=spec_content,
-        test_strategy=test_strategy
+        module_path=f"tlc/{module_name}.py",
+        test_path=f"tlc/tests/test_{module_name}.py",
     )
+
+
+def render_prompt(spec_bytes, names, prompt_path=PROMPT_PATH, edit_pyproject=True):
+    """Render the Claude prompt for the specification contents and return the prompt path."""
+    spec_content = spec_bytes.decode('utf-8')
     
-    # Ensure the prompt directory exists
-    os.makedirs('bin/prompt', exist_ok=True)
+    # Extract test strategy info - simple check if tests are mentioned
+    test_strategy = _TEST_RE.search(spec_bytes) is not None
     
-    # Write the prompt to the expected location
-    with open('bin/prompt/the_last_compiler.md', 'w') as f:
-        f.write(prompt)
+    prompt_path.parent.mkdir(parents=True, exist_ok=True)
+    get_claude_template().stream(
+        module_name=names.module_name,
+        command_name=names.command_name,
+        specification=spec_content,
+        test_strategy=test_strategy,
+        edit_pyproject=edit_pyproject
+    ).dump(str(prompt_path), encoding='utf-8')
     
-    return prompt
+    return prompt_path
 
 
-def run_claude_code():
+def run_claude_code(prompt_path=PROMPT_PATH):
     """Run Claude Code with the generated prompt."""
-    cmd = 'claude "Follow the instructions in bin/prompt/the_last_compiler.md"'
-    return subprocess.call(cmd, shell=True)
+    try:
+        return subprocess.run(["claude", f"Follow the instructions in {prompt_path}"], check=False).returncode
+    except FileNotFoundError:
+        print("Error: claude not found, is it installed?")
+        return 1
+
+
+async def run_claude_code_async(prompt_path):
+    """Run Claude Code non-interactively with the generated prompt, so several can run at once."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "claude", "-p", "--permission-mode", "acceptEdits", f"Follow the instructions in {prompt_path}",
+            stdin=asyncio.subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        print("Error: claude not found, is it installed?")
+        return 1
+    return await proc.wait()
 
 
 def create_new_module(module_name):
@@ -99,74 +157,231 @@ def create_new_module(module_name):
     if not module_name.endswith('.md'):
         module_name += '.md'
     
-    # Check if file already exists
-    if os.path.exists(module_name):
+    # Create the new markdown file, refusing to overwrite an existing one
+    try:
+        with open(module_name, 'x') as f:
+            f.write(NEW_MODULE_TEMPLATE.format(module_name=spec_names(module_name).module_name))
+    except FileExistsError:
         print(f"Error: File {module_name} already exists")
         return False
     
-    # Create the new markdown file
-    with open(module_name, 'w') as f:
-        python_module_name = os.path.basename(module_name).replace('-', '_')
-        if python_module_name.endswith('.md'):
-            python_module_name = python_module_name[:-3]
-        
-        content = NEW_MODULE_TEMPLATE.format(module_name=python_module_name)
-        f.write(content)
-    
     print(f"Created new module specification at {module_name}")
     return True
 
 
-def compile_module(spec_path):
-    """Compile the module specified in the markdown file."""
-    if not os.path.exists(spec_path):
+def spec_cache_key(spec_bytes):
+    """Hash the spec bytes together with the prompt template they are compiled with."""
+    return hashlib.blake2b(spec_bytes + CLAUDE_PROMPT_TEMPLATE.encode(), digest_size=16).hexdigest()
+
+
+def load_compile_cache():
+    """Load the record of which spec hash each compiled module was built from."""
+    try:
+        with open(COMPILE_CACHE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def record_compiled(module_path, key):
+    """Atomically record that module_path was compiled from the spec with the given key."""
+    cache = load_compile_cache()
+    cache[os.path.abspath(module_path)] = key
+    
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.json')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, COMPILE_CACHE_PATH)
+    except OSError as e:
+        print(f"Warning: could not update compile cache: {e}")
+
+
+def read_spec(spec_path):
+    """Read the specification file, or return None if it does not exist."""
+    try:
+        return Path(spec_path).read_bytes()
+    except FileNotFoundError:
         print(f"Error: Specification file {spec_path} not found")
+        return None
+
+
+def is_compiled(spec_path, names, key):
+    """Check whether the module exists and was last compiled from a spec with the given key."""
+    if os.path.exists(names.module_path) and load_compile_cache().get(os.path.abspath(names.module_path)) == key:
+        print(f"{names.module_path} is up to date with {spec_path} (cache hit)")
+        return True
+    return False
+
+
+def compile_module(spec_path, names, force=False):
+    """Compile the module specified in the markdown file, unless it is already up to date."""
+    spec_bytes = read_spec(spec_path)
+    if spec_bytes is None:
         return False
+    key = spec_cache_key(spec_bytes)
+    if not force and is_compiled(spec_path, names, key):
+        return True
     
-    render_prompt(spec_path)
+    render_prompt(spec_bytes, names)
     print(f"Compiling module from {spec_path}...")
-    return run_claude_code()
+    if run_claude_code() != 0:
+        return False
+    # Claude exits cleanly when it declines to implement a spec, so check the module was written
+    if not os.path.exists(names.module_path):
+        print(f"Error: {names.module_path} was not created from {spec_path}")
+        return False
+    
+    record_compiled(names.module_path, key)
+    return True
 
 
-def ensure_module_compiled(spec_path):
-    """Ensure the module is compiled before running/testing it."""
-    module_name = convert_name(os.path.basename(spec_path))
-    module_path = f"tlc/{module_name}.py"
+async def compile_module_async(spec_path, semaphore, force=False):
+    """Compile one module from a batch, holding the semaphore while Claude Code runs."""
+    names = spec_names(spec_path)
+    spec_bytes = read_spec(spec_path)
+    if spec_bytes is None:
+        return False
+    key = spec_cache_key(spec_bytes)
+    if not force and is_compiled(spec_path, names, key):
+        return True
     
-    if not os.path.exists(module_path):
+    async with semaphore:
+        # Each module gets its own prompt file so concurrent compiles don't clobber each other, and
+        # pyproject.toml is left to add_project_scripts so they don't race on it either
+        prompt_path = render_prompt(spec_bytes, names, PROMPT_PATH.parent / f"{names.module_name}.md",
+                                    edit_pyproject=False)
+        print(f"Compiling module from {spec_path}...")
+        if await run_claude_code_async(prompt_path) != 0:
+            print(f"Error: Failed to compile {spec_path}")
+            return False
+    if not os.path.exists(names.module_path):
+        print(f"Error: {names.module_path} was not created from {spec_path}")
+        return False
+    
+    record_compiled(names.module_path, key)
+    return True
+
+
+def compile_all(spec_paths, jobs=DEFAULT_COMPILE_JOBS, force=False):
+    """Compile several module specifications concurrently, running at most `jobs` Claude Code sessions at once."""
+    # Specs that compile to the same module would share a prompt file, a module file and an entry point
+    specs_by_module = {}
+    for spec_path in spec_paths:
+        specs_by_module.setdefault(spec_names(spec_path).module_name, {}).setdefault(os.path.realpath(spec_path), spec_path)
+    collisions = [list(specs.values()) for specs in specs_by_module.values() if len(specs) > 1]
+    if collisions:
+        for paths in collisions:
+            print(f"Error: {', '.join(paths)} would all compile to the same module")
+        return False
+    spec_paths = [next(iter(specs.values())) for specs in specs_by_module.values()]
+    
+    async def compile_batch():
+        semaphore = asyncio.Semaphore(jobs)
+        return await asyncio.gather(*(compile_module_async(p, semaphore, force) for p in spec_paths))
+    
+    results = asyncio.run(compile_batch())
+    compiled = [spec_names(p) for p, ok in zip(spec_paths, results) if ok]
+    if compiled and not add_project_scripts(compiled):
+        return False
+    return all(results)
+
+
+def add_project_scripts(names_list):
+    """Add any missing [project.scripts] entry points for the modules to pyproject.toml, leaving the rest of the file as is."""
+    try:
+        content = PYPROJECT_PATH.read_text()
+        project = tomllib.loads(content).get('project', {})
+    except FileNotFoundError:
+        print(f"Error: {PYPROJECT_PATH} not found, could not add entry points")
+        return False
+    except tomllib.TOMLDecodeError as e:
+        print(f"Error: could not parse {PYPROJECT_PATH}: {e}")
+        return False
+    
+    entries = {
+        n.command_name: f'{n.command_name} = "tlc.{n.module_name}:main"'
+        for n in names_list if n.command_name not in project.get('scripts', {})
+    }
+    if not entries:
+        return True
+    lines = '\n'.join(entries.values())
+    
+    header = _SCRIPTS_HEADER_RE.search(content)
+    if header:
+        content = content[:header.end()] + '\n' + lines + content[header.end():]
+    elif 'scripts' in project:
+        # project.scripts is an inline table or dotted keys, which can't be extended by inserting lines
+        print(f"Error: add these entry points to [project.scripts] in {PYPROJECT_PATH}:")
+        print(lines)
+        return False
+    else:
+        content = content.rstrip('\n') + '\n\n[project.scripts]\n' + lines + '\n'
+    
+    # Only write the edit if it parses and the new entry points landed in [project.scripts]
+    try:
+        scripts = tomllib.loads(content).get('project', {}).get('scripts', {})
+    except tomllib.TOMLDecodeError:
+        scripts = {}
+    if not all(name in scripts for name in entries):
+        print(f"Error: could not add entry points to {PYPROJECT_PATH}, add them to [project.scripts] by hand:")
+        print(lines)
+        return False
+    
+    PYPROJECT_PATH.write_text(content)
+    return True
+
+
+def ensure_module_compiled(spec_path, names):
+    """Ensure the module is compiled before running/testing it."""
+    if not os.path.exists(names.module_path):
         print(f"Module not found. Compiling {spec_path} first...")
-        if not compile_module(spec_path):
+        if not compile_module(spec_path, names):
             return False
     return True
 
 
-def test_module(spec_path):
+def test_module(spec_path, names):
     """Test the module specified in the markdown file."""
-    if not ensure_module_compiled(spec_path):
+    if not ensure_module_compiled(spec_path, names):
         return False
     
-    module_name = convert_name(os.path.basename(spec_path))
-    test_path = f"tlc/tests/test_{module_name}.py"
-    
-    if not os.path.exists(test_path):
-        print(f"No tests found at {test_path}")
+    if not os.path.exists(names.test_path):
+        print(f"No tests found at {names.test_path}")
         return False
     
-    print(f"Running tests for {module_name}...")
-    return subprocess.call([sys.executable, "-m", "pytest", test_path])
+    print(f"Running tests for {names.module_name}...")
+    return subprocess.call([sys.executable, "-m", "pytest", names.test_path]) == 0
 
 
-def run_module(spec_path, args):
+def run_module(spec_path, names, args):
     """Run the module specified in the markdown file with arguments."""
-    if not ensure_module_compiled(spec_path):
+    if not ensure_module_compiled(spec_path, names):
         return False
     
-    module_name = convert_name(os.path.basename(spec_path))
-    command_name = module_name.replace('_', '-')
-    
-    print(f"Running {command_name} with args: {' '.join(args)}")
-    cmd = ["uv", "run", command_name] + args
-    return subprocess.call(cmd)
+    print(f"Running {names.command_name} with args: {' '.join(args)}")
+    cmd = ["uv", "run", names.command_name] + args
+    sys.stdout.flush()
+    try:
+        os.execvp(cmd[0], cmd)
+    except FileNotFoundError:
+        print(f"Error: {cmd[0]} not found, is it installed?")
+        return False
+
+
+def print_version():
+    """Print the tlc version."""
+    print("tlc version 0.1.0")
+    return True
+
+
+def positive_int(value):
+    """argparse type for options that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
 
 
 def main():
@@ -176,39 +391,44 @@ def main():
     # tlc new
     new_parser = subparsers.add_parser("new", help="Create a new module specification")
     new_parser.add_argument("spec_file", help="Name of the new module specification file")
+    new_parser.set_defaults(func=lambda a: create_new_module(a.spec_file))
     
     # tlc compile
     compile_parser = subparsers.add_parser("compile", help="Compile a module from specification")
     compile_parser.add_argument("spec_file", help="Path to the module specification file")
+    compile_parser.add_argument("--force", action="store_true", help="Recompile even if the spec is unchanged")
+    compile_parser.set_defaults(func=lambda a: compile_module(a.spec_file, spec_names(a.spec_file), a.force))
+    
+    # tlc compile-all
+    compile_all_parser = subparsers.add_parser("compile-all", help="Compile several module specifications concurrently")
+    compile_all_parser.add_argument("spec_files", nargs="+", help="Paths to the module specification files")
+    compile_all_parser.add_argument("-j", "--jobs", type=positive_int, default=DEFAULT_COMPILE_JOBS,
+                                    help="Maximum number of concurrent Claude Code sessions")
+    compile_all_parser.add_argument("--force", action="store_true", help="Recompile even if the specs are unchanged")
+    compile_all_parser.set_defaults(func=lambda a: compile_all(a.spec_files, a.jobs, a.force))
     
     # tlc test
     test_parser = subparsers.add_parser("test", help="Test a compiled module")
     test_parser.add_argument("spec_file", help="Path to the module specification file")
+    test_parser.set_defaults(func=lambda a: test_module(a.spec_file, spec_names(a.spec_file)))
     
     # tlc run
     run_parser = subparsers.add_parser("run", help="Run a compiled module")
     run_parser.add_argument("spec_file", help="Path to the module specification file")
     run_parser.add_argument("module_args", nargs="*", help="Arguments to pass to the module")
+    run_parser.set_defaults(func=lambda a: run_module(a.spec_file, spec_names(a.spec_file), a.module_args))
     
     # tlc version
-    subparsers.add_parser("version", help="Print the tlc version")
+    version_parser = subparsers.add_parser("version", help="Print the tlc version")
+    version_parser.set_defaults(func=lambda a: print_version())
     
     args = parser.parse_args()
     
-    if args.command == "new":
-        return 0 if create_new_module(args.spec_file) else 1
-    elif args.command == "compile":
-        return 0 if compile_module(args.spec_file) else 1
-    elif args.command == "test":
-        return 0 if test_module(args.spec_file) else 1
-    elif args.command == "run":
-        return 0 if run_module(args.spec_file, args.module_args) else 1
-    elif args.command == "version":
-        print("tlc version 0.1.0")
-        return 0
-    else:
+    if args.command is None:
         parser.print_help()
         return 1
+    
+    return 0 if args.func(args) else 1
 
 
 if __name__ == "__main__":